@@ -2,66 +2,186 @@
 Inline Query Handler for Search Functionality
 """
 
+import asyncio
+import hashlib
 import logging
+from typing import Dict, List, Optional
 from pyrogram import Client, filters
 from pyrogram.types import (
     InlineQuery, InlineQueryResultDocument, InlineQueryResultVideo, InlineQueryResultArticle,
     InlineQueryResultAudio, InlineQueryResultPhoto, InlineQueryResultAnimation,
     InlineQueryResultCachedVideo, InlineQueryResultCachedDocument, 
     InlineQueryResultCachedAudio, InlineQueryResultCachedPhoto, InlineQueryResultCachedAnimation,
-    InputTextMessageContent
+    InputTextMessageContent, InlineKeyboardMarkup, InlineKeyboardButton
 )
-from utils import is_subscribed, is_authorized_user, format_file_size, get_file_type_emoji, escape_html
+from utils import TTLCache, is_subscribed, is_authorized_user, format_file_size, get_file_type_emoji, escape_html
 from config import Config
+from database import encode_search_cursor
 
 logger = logging.getLogger(__name__)
 
+# Bot username never changes while running, so fetch it once
+_BOT_USERNAME: Optional[str] = None
+
+async def _get_bot_username(client: Client) -> str:
+    """Return the bot username, calling get_me() only on first use"""
+    global _BOT_USERNAME
+    if _BOT_USERNAME is None:
+        _BOT_USERNAME = (await client.get_me()).username
+    return _BOT_USERNAME
+
+# Telegram accepts at most 50 results per answer
+_PAGE_SIZE = min(Config.MAX_RESULTS, 50)
+
+# Hot (query, file_type, page cursor) searches are kept in memory for CACHE_TIME seconds
+_SEARCH_CACHE = TTLCache(maxsize=1024, ttl=Config.CACHE_TIME)
+_INFLIGHT: Dict[tuple, asyncio.Future] = {}
+
+async def _cached_search(db, search_query: str, file_type: Optional[str], after: str = "") -> List[dict]:
+    """Search media through the in-memory cache, coalescing identical concurrent searches"""
+    key = (search_query.lower(), file_type, after)
+    results = _SEARCH_CACHE.get(key)
+    if results is not None:
+        return results
+    
+    # Someone is already fetching this key, share their result; shield it so a
+    # cancelled waiter doesn't cancel the shared future for everyone else
+    pending = _INFLIGHT.get(key)
+    if pending is not None:
+        try:
+            return await asyncio.shield(pending)
+        except asyncio.CancelledError:
+            # Only the leader was cancelled, not us: retry and let a new leader take over
+            if not pending.cancelled() or asyncio.current_task().cancelling():
+                raise
+            return await _cached_search(db, search_query, file_type, after)
+    
+    future = asyncio.get_running_loop().create_future()
+    _INFLIGHT[key] = future
+    try:
+        # One extra row tells us whether another page exists
+        results = await db.search_media(
+            search_query, file_type, limit=_PAGE_SIZE + 1, after=after or None
+        )
+        # None means the database failed; never cache or answer that as "no matches"
+        if results is None:
+            raise RuntimeError(f"Search failed for '{search_query}'")
+    except Exception as e:
+        if not future.done():
+            future.set_exception(e)
+            # Mark retrieved so a future without waiters doesn't log a warning
+            future.exception()
+        raise
+    else:
+        _SEARCH_CACHE.set(key, results)
+        if not future.done():
+            future.set_result(results)
+    finally:
+        # Leader was cancelled; waiters see the cancelled future and retry
+        if not future.done():
+            future.cancel()
+        del _INFLIGHT[key]
+    
+    return results
+
+# Telegram-side cache for answers that carry no user specific data
+_PUBLIC_CACHE_TIME = 60
+# Denied users are answered personally, but retries within this window skip the bot
+_DENIED_CACHE_TIME = 30
+
+# Static answers reused for every query instead of being rebuilt each time
+_UNAUTHORIZED_RESULT = InlineQueryResultArticle(
+    id="unauthorized",
+    title="❌ Unauthorized Access",
+    description="Contact admin for access",
+    input_message_content=InputTextMessageContent(
+        "❌ You are not authorized to use this bot.\n"
+        "Contact an administrator for access."
+    )
+)
+
+_NO_VIDEOS_RESULT = InlineQueryResultArticle(
+    id="no_videos",
+    title="🎬 No Recent Videos",
+    description="Upload videos to channels to see them here",
+    input_message_content=InputTextMessageContent(
+        "🎬 <b>No recent videos found</b>\n\n"
+        "Recent videos will appear here when you upload them to your channels.\n"
+        "Type a search term to find specific content."
+    )
+)
+
+_ERROR_FALLBACK_RESULT = InlineQueryResultArticle(
+    id="error_fallback",
+    title="🔍 Search Your Videos",
+    description="Type to search your video collection",
+    input_message_content=InputTextMessageContent(
+        "🔍 <b>Search your video collection</b>\n\n"
+        "Type your search query to find specific videos.\n\n"
+        "<b>Examples:</b>\n"
+        "• <code>movie name</code>\n"
+        "• <code>action</code>\n"
+        "• <code>2023</code>"
+    )
+)
+
+_ERROR_RESULT = InlineQueryResultArticle(
+    id="error",
+    title="❌ Search Error",
+    description="An error occurred while searching",
+    input_message_content=InputTextMessageContent(
+        "❌ <b>Search Error</b>\n\n"
+        "An error occurred while searching. Please try again later.\n"
+        "If the problem persists, contact the bot administrators."
+    )
+)
+
+# Needs the bot username, so it is built on first use
+_AUTH_REQUIRED_RESULT: Optional[InlineQueryResultDocument] = None
+
+async def _get_auth_required_result(client: Client) -> InlineQueryResultDocument:
+    """Return the cached "join channel" result, building it on first use"""
+    global _AUTH_REQUIRED_RESULT
+    if _AUTH_REQUIRED_RESULT is None:
+        _AUTH_REQUIRED_RESULT = InlineQueryResultDocument(
+            id="auth_required",
+            title="🔒 Authorization Required",
+            description="Join our channel to use this bot",
+            document_url="https://telegram.org/",
+            mime_type="text/plain",
+            input_message_content=InputTextMessageContent(
+                "🔒 You need to join our channel to use this bot.\n"
+                f"Start the bot @{await _get_bot_username(client)} for more information."
+            )
+        )
+    return _AUTH_REQUIRED_RESULT
+
 @Client.on_inline_query()
 async def inline_query_handler(client: Client, query: InlineQuery):
     """Handle inline queries for media search"""
     user_id = query.from_user.id
     search_query = query.query.strip()
     
+    # Subscription and authorization checks are independent, so run them together
+    subscribed, authorized = await asyncio.gather(
+        is_subscribed(client, user_id),
+        is_authorized_user(user_id, client)
+    )
+    
     # Check subscription
-    if not await is_subscribed(client, user_id):
-        results = [
-            InlineQueryResultDocument(
-                id="auth_required",
-                title="🔒 Authorization Required",
-                description="Join our channel to use this bot",
-                document_url="https://telegram.org/",
-                mime_type="text/plain",
-                input_message_content=InputTextMessageContent(
-                    "🔒 You need to join our channel to use this bot.\n"
-                    f"Start the bot @{(await client.get_me()).username} for more information."
-                )
-            )
-        ]
-        
+    if not subscribed:
         await query.answer(
-            results=results,
-            cache_time=0,
+            results=[await _get_auth_required_result(client)],
+            cache_time=_DENIED_CACHE_TIME,
             is_personal=True
         )
         return
     
     # Check authorization
-    if not await is_authorized_user(user_id, client):
-        results = [
-            InlineQueryResultArticle(
-                id="unauthorized",
-                title="❌ Unauthorized Access",
-                description="Contact admin for access",
-                input_message_content=InputTextMessageContent(
-                    "❌ You are not authorized to use this bot.\n"
-                    "Contact an administrator for access."
-                )
-            )
-        ]
-        
+    if not authorized:
         await query.answer(
-            results=results,
-            cache_time=0,
+            results=[_UNAUTHORIZED_RESULT],
+            cache_time=_DENIED_CACHE_TIME,
             is_personal=True
         )
         return
@@ -71,32 +191,22 @@ async def inline_query_handler(client: Client, query: InlineQuery):
         try:
             # Get recent videos specifically (limit to 10 for immediate display)
             recent_videos = await client.db.get_recent_videos(limit=10)
+            if recent_videos is None:
+                raise RuntimeError("Database failed to return recent videos")
             
-            results = []
-            if recent_videos:
-                for idx, media in enumerate(recent_videos):
-                    try:
-                        result = create_inline_result(media, idx)
-                        if result:
-                            results.append(result)
-                    except Exception as e:
-                        logger.error(f"Error creating inline result: {e}")
-                        continue
+            # Only a truly empty collection is safe for Telegram to cache for everyone
+            if not recent_videos:
+                await query.answer(
+                    results=[_NO_VIDEOS_RESULT],
+                    cache_time=_PUBLIC_CACHE_TIME,
+                    is_personal=False
+                )
+                return
             
-            # If no video results, show a helpful message
-            if not results:
-                results = [
-                    InlineQueryResultArticle(
-                        id="no_videos",
-                        title="🎬 No Recent Videos",
-                        description="Upload videos to channels to see them here",
-                        input_message_content=InputTextMessageContent(
-                            "🎬 <b>No recent videos found</b>\n\n"
-                            "Recent videos will appear here when you upload them to your channels.\n"
-                            "Type a search term to find specific content."
-                        )
-                    )
-                ]
+            results = [
+                r for r in (_safe_inline_result(m, i) for i, m in enumerate(recent_videos))
+                if r is not None
+            ] or [_NO_VIDEOS_RESULT]
             
             await query.answer(
                 results=results,
@@ -106,26 +216,10 @@ async def inline_query_handler(client: Client, query: InlineQuery):
             return
             
         except Exception as e:
-            logger.error(f"Error getting recent videos: {e}")
+            logger.error("Error getting recent videos: %s", e)
             # Fallback result
-            results = [
-                InlineQueryResultArticle(
-                    id="error_fallback",
-                    title="🔍 Search Your Videos",
-                    description="Type to search your video collection",
-                    input_message_content=InputTextMessageContent(
-                        "🔍 <b>Search your video collection</b>\n\n"
-                        "Type your search query to find specific videos.\n\n"
-                        "<b>Examples:</b>\n"
-                        "• <code>movie name</code>\n"
-                        "• <code>action</code>\n"
-                        "• <code>2023</code>"
-                    )
-                )
-            ]
-            
             await query.answer(
-                results=results,
+                results=[_ERROR_FALLBACK_RESULT],
                 cache_time=5,
                 is_personal=True
             )
@@ -133,20 +227,22 @@ async def inline_query_handler(client: Client, query: InlineQuery):
     
     # Parse query for file type filter
     file_type_filter = None
-    if " | " in search_query:
-        search_query, file_type_filter = search_query.split(" | ", 1)
-        file_type_filter = file_type_filter.strip().lower()
-        search_query = search_query.strip()
+    head, sep, tail = search_query.partition(" | ")
+    if sep:
+        search_query, file_type_filter = head.strip(), tail.strip().lower()
     
     try:
         # Search database
-        logger.info(f"Searching for: '{search_query}' with filter: {file_type_filter}")
-        media_results = await client.db.search_media(search_query, file_type_filter)
-        logger.info(f"Found {len(media_results)} results")
+        logger.info("Searching for: '%s' with filter: %s", search_query, file_type_filter)
+        media_results = await _cached_search(client.db, search_query, file_type_filter, query.offset)
+        logger.info("Found %d results", len(media_results))
+        
+        has_more = len(media_results) > _PAGE_SIZE
+        media_results = media_results[:_PAGE_SIZE]
         
         if not media_results:
-            from pyrogram.types import InlineQueryResultArticle
-            results = [
+            # Not user specific, so let Telegram serve repeats without calling us
+            results = [] if query.offset else [
                 InlineQueryResultArticle(
                     id="no_results",
                     title="🔍 Not Found",
@@ -161,138 +257,169 @@ async def inline_query_handler(client: Client, query: InlineQuery):
                     )
                 )
             ]
-        else:
-            results = []
-            
-            for idx, media in enumerate(media_results):
-                try:
-                    result = create_inline_result(media, idx)
-                    if result:
-                        results.append(result)
-                except Exception as e:
-                    logger.error(f"Error creating inline result: {e}")
-                    continue
+            await query.answer(
+                results=results,
+                cache_time=_PUBLIC_CACHE_TIME,
+                is_personal=False
+            )
+            return
+        
+        results = [
+            r for r in (_safe_inline_result(m, i) for i, m in enumerate(media_results))
+            if r is not None
+        ]
         
         # Answer inline query
         await query.answer(
-            results=results[:50],  # Telegram limit
+            results=results,
             cache_time=Config.CACHE_TIME,
             is_personal=True,
-            next_offset=str(len(results)) if len(media_results) >= Config.MAX_RESULTS else ""
+            next_offset=encode_search_cursor(media_results[-1]) if has_more else ""
         )
         
     except Exception as e:
-        logger.error(f"Error handling inline query: {e}")
-        
-        # Error result
-        from pyrogram.types import InlineQueryResultArticle
-        results = [
-            InlineQueryResultArticle(
-                id="error",
-                title="❌ Search Error",
-                description="An error occurred while searching",
-                input_message_content=InputTextMessageContent(
-                    "❌ <b>Search Error</b>\n\n"
-                    "An error occurred while searching. Please try again later.\n"
-                    "If the problem persists, contact the bot administrators."
-                )
-            )
-        ]
+        logger.error("Error handling inline query: %s", e)
         
         await query.answer(
-            results=results,
+            results=[_ERROR_RESULT],
             cache_time=0,
             is_personal=True
         )
 
+_ELLIPSIS = "…"
+
+def _truncate(text: str, limit: int) -> str:
+    """Shorten text to at most limit characters, ending with an ellipsis"""
+    return text if len(text) <= limit else text[:limit - 1] + _ELLIPSIS
+
+def _safe_inline_result(media: dict, idx: int):
+    """Create inline result, logging and skipping media that fails to build"""
+    try:
+        return create_inline_result(media, idx)
+    except Exception as media_error:
+        logger.warning("Skipped media at index %d: %s", idx, media_error)
+        return None
+
+# Search and Join buttons attached to every video result
+_VIDEO_KEYBOARD = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("🔍 Search", switch_inline_query_current_chat=""),
+        InlineKeyboardButton("📢 Join", url="https://t.me/daawotv")
+    ]
+])
+
+# Built results keyed by file_id plus the fields they display, so popular media is
+# only built once and edited posts get a fresh result; expires with _SEARCH_CACHE
+_RESULT_CACHE = TTLCache(maxsize=4096, ttl=Config.CACHE_TIME)
+
 def create_inline_result(media: dict, index: int):
-    """Create inline result based on media type"""
+    """Create inline result based on media type, reusing cached results"""
+    file_id = media.get("file_id")
+    if not file_id:
+        logger.error("Missing file_id for media at index %d", index)
+        return None
+    
+    key = (
+        file_id, media.get("file_type"), media.get("file_name"),
+        media.get("caption"), media.get("file_size")
+    )
+    result = _RESULT_CACHE.get(key)
+    if result is None:
+        result = _build_inline_result(media, file_id)
+        if result is not None:
+            _RESULT_CACHE.set(key, result)
+    return result
+
+def _build_inline_result(media: dict, file_id: str):
+    """Build a new inline result for media"""
     file_type = media.get("file_type")
     file_name = media.get("file_name", "Unknown")
     file_size = media.get("file_size", 0)
     caption = media.get("caption", "")
-    file_id = media.get("file_id")
+    
+    # Result ids must be unique per answer and at most 64 bytes; file_id can be longer
+    result_id = hashlib.md5(file_id.encode()).hexdigest()
     
     # Truncate long filenames for display
-    display_name = file_name if len(file_name) <= 50 else file_name[:47] + "..."
+    display_name = _truncate(file_name, 50)
     
     # Create description
     size_text = format_file_size(file_size) if file_size else "Unknown size"
     description = f"{size_text}"
     
     if caption:
-        caption_preview = caption[:100] + "..." if len(caption) > 100 else caption
-        description += f" • {caption_preview}"
+        description += f" • {_truncate(caption, 100)}"
     
     # Get emoji for file type
     emoji = get_file_type_emoji(file_type)
     title = f"{emoji} {display_name}"
     
+    builder = _BUILDERS.get(file_type, _build_file)
     try:
-        if file_type == "video":
-            from pyrogram.types import InlineQueryResultCachedVideo, InlineKeyboardMarkup, InlineKeyboardButton
-            
-            # Create custom keyboard with Search and Join buttons
-            keyboard = InlineKeyboardMarkup([
-                [
-                    InlineKeyboardButton("🔍 Search", switch_inline_query_current_chat=""),
-                    InlineKeyboardButton("📢 Join", url="https://t.me/daawotv")
-                ]
-            ])
-            
-            return InlineQueryResultCachedVideo(
-                id=f"video_{index}",
-                video_file_id=file_id,
-                title=title,
-                description=description,
-                caption=f"{file_name}\n\nKUSO BIIT @DAAWOTV",
-                reply_markup=keyboard
-            )
-            
-        elif file_type == "document":
-            from pyrogram.types import InlineQueryResultCachedDocument
-            return InlineQueryResultCachedDocument(
-                id=f"doc_{index}",
-                title=title,
-                description=description,
-                document_file_id=file_id
-            )
-            
-        elif file_type == "audio":
-            from pyrogram.types import InlineQueryResultCachedAudio
-            return InlineQueryResultCachedAudio(
-                id=f"audio_{index}",
-                audio_file_id=file_id,
-                title=title
-            )
-            
-        elif file_type == "photo":
-            from pyrogram.types import InlineQueryResultCachedPhoto
-            return InlineQueryResultCachedPhoto(
-                id=f"photo_{index}",
-                photo_file_id=file_id,
-                title=title,
-                description=description
-            )
-            
-        elif file_type == "gif":
-            from pyrogram.types import InlineQueryResultCachedAnimation
-            return InlineQueryResultCachedAnimation(
-                id=f"gif_{index}",
-                animation_file_id=file_id,
-                title=title
-            )
-            
-        else:
-            # Fallback to document
-            from pyrogram.types import InlineQueryResultCachedDocument
-            return InlineQueryResultCachedDocument(
-                id=f"file_{index}",
-                title=title,
-                description=description,
-                document_file_id=file_id
-            )
-            
+        return builder(result_id, file_id, title, description, file_name)
     except Exception as e:
-        logger.error(f"Error creating inline result for {file_type}: {e}")
+        logger.error("Error creating inline result for %s: %s", file_type, e)
         return None
+
+def _build_video(result_id: str, file_id: str, title: str, description: str, file_name: str):
+    """Build a cached video result"""
+    return InlineQueryResultCachedVideo(
+        id=f"video_{result_id}",
+        video_file_id=file_id,
+        title=title,
+        description=description,
+        caption=f"{file_name}\n\nKUSO BIIT @DAAWOTV",
+        reply_markup=_VIDEO_KEYBOARD
+    )
+
+def _build_document(result_id: str, file_id: str, title: str, description: str, file_name: str):
+    """Build a cached document result"""
+    return InlineQueryResultCachedDocument(
+        id=f"doc_{result_id}",
+        title=title,
+        description=description,
+        document_file_id=file_id
+    )
+
+def _build_audio(result_id: str, file_id: str, title: str, description: str, file_name: str):
+    """Build a cached audio result"""
+    return InlineQueryResultCachedAudio(
+        id=f"audio_{result_id}",
+        audio_file_id=file_id,
+        title=title
+    )
+
+def _build_photo(result_id: str, file_id: str, title: str, description: str, file_name: str):
+    """Build a cached photo result"""
+    return InlineQueryResultCachedPhoto(
+        id=f"photo_{result_id}",
+        photo_file_id=file_id,
+        title=title,
+        description=description
+    )
+
+def _build_gif(result_id: str, file_id: str, title: str, description: str, file_name: str):
+    """Build a cached animation result"""
+    return InlineQueryResultCachedAnimation(
+        id=f"gif_{result_id}",
+        animation_file_id=file_id,
+        title=title
+    )
+
+def _build_file(result_id: str, file_id: str, title: str, description: str, file_name: str):
+    """Build a cached document result for unknown file types"""
+    return InlineQueryResultCachedDocument(
+        id=f"file_{result_id}",
+        title=title,
+        description=description,
+        document_file_id=file_id
+    )
+
+# Result builder per media file type
+_BUILDERS = {
+    "video": _build_video,
+    "document": _build_document,
+    "audio": _build_audio,
+    "photo": _build_photo,
+    "gif": _build_gif
+}
@@ -3,6 +3,8 @@ Database Operations with MongoDB
 """
 
 import logging
+from bson import ObjectId
+from bson.errors import InvalidId
 from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo.errors import DuplicateKeyError
 from config import Config
@@ -12,6 +14,29 @@ from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Only the fields needed to build inline results (plus _id and date for paging)
+MEDIA_PROJECTION = {
+    "file_id": 1,
+    "file_name": 1,
+    "file_size": 1,
+    "file_type": 1,
+    "caption": 1,
+    "date": 1
+}
+
+def encode_search_cursor(media: Dict[str, Any]) -> str:
+    """Encode the sort key of the last search result as a page cursor"""
+    return f"{media['date'].isoformat()}|{media['_id']}"
+
+def decode_search_cursor(cursor: str) -> Optional[tuple]:
+    """Decode a page cursor into its (date, _id) sort key"""
+    try:
+        date_text, _, object_id = cursor.partition("|")
+        return datetime.fromisoformat(date_text), ObjectId(object_id)
+    except (ValueError, InvalidId):
+        logger.warning(f"Invalid search cursor: {cursor}")
+        return None
+
 class Database:
     def __init__(self):
         self.client = None
@@ -31,6 +56,7 @@ class Database:
             await self.collection.create_index("chat_id")
             await self.collection.create_index("message_id")
             await self.collection.create_index([("date", -1)])  # For recent media queries
+            await self.collection.create_index([("date", -1), ("_id", -1)])  # For keyset pagination of searches
             await self.collection.create_index([("file_type", 1), ("date", -1)])  # Compound index for type + date
             await self.collection.create_index("file_name")  # Additional index for filename searches
             
@@ -64,8 +90,16 @@ class Database:
             logger.error(f"Error saving media: {e}")
             return False
     
-    async def search_media(self, query: str, file_type: str = None) -> List[Dict[str, Any]]:
-        """Search media by query with optimization for large datasets"""
+    async def search_media(self, query: str, file_type: str = None, limit: int = None,
+                           after: str = None) -> Optional[List[Dict[str, Any]]]:
+        """Search media by query with optimization for large datasets
+        
+        ``after`` is a cursor from encode_search_cursor(); results continue
+        strictly after that document in (date, _id) descending order.
+        Returns None if the search failed, so callers can tell it from no matches.
+        """
+        if limit is None:
+            limit = Config.MAX_RESULTS
         try:
             # Create search filter
             search_filter = {}
@@ -79,44 +113,39 @@ class Database:
                 # Use more efficient regex patterns
                 escaped_query = re.escape(query.strip())
                 
-                # Prioritize exact matches and prefix matches for better performance
+                # A substring match already covers prefix matches, so one regex per field is enough
                 or_conditions = [
-                    {"file_name": {"$regex": f"^{escaped_query}", "$options": "i"}},  # Prefix match (faster)
-                    {"file_name": {"$regex": escaped_query, "$options": "i"}},       # Full text match
+                    {"file_name": {"$regex": escaped_query, "$options": "i"}}
                 ]
                 
                 # Add caption search only if query is longer than 3 characters (avoid too broad searches)
                 if len(query.strip()) > 3:
-                    or_conditions.extend([
-                        {"caption": {"$regex": f"^{escaped_query}", "$options": "i"}},
-                        {"caption": {"$regex": escaped_query, "$options": "i"}}
-                    ])
+                    or_conditions.append({"caption": {"$regex": escaped_query, "$options": "i"}})
                 
                 search_filter["$or"] = or_conditions
             
-            # Use projection to reduce memory usage - only fetch needed fields
-            projection = {
-                "file_id": 1,
-                "file_name": 1,
-                "file_size": 1,
-                "file_type": 1,
-                "caption": 1,
-                "date": 1
-            }
+            # Keyset pagination: seek past the last seen document instead of skipping rows
+            sort_key = decode_search_cursor(after) if after else None
+            if sort_key:
+                last_date, last_id = sort_key
+                search_filter = {"$and": [search_filter, {"$or": [
+                    {"date": {"$lt": last_date}},
+                    {"date": last_date, "_id": {"$lt": last_id}}
+                ]}]}
             
             # Execute search with optimizations
             cursor = self.collection.find(
                 search_filter, 
-                projection
-            ).sort("date", -1).limit(Config.MAX_RESULTS)
+                MEDIA_PROJECTION
+            ).sort([("date", -1), ("_id", -1)]).limit(limit)
             
-            results = await cursor.to_list(length=Config.MAX_RESULTS)
+            results = await cursor.to_list(length=limit)
             
             return results
             
         except Exception as e:
             logger.error(f"Error searching media: {e}")
-            return []
+            return None
     
     async def get_stats(self) -> Dict[str, Any]:
         """Get database statistics"""
@@ -170,20 +199,10 @@ class Database:
     async def get_recent_media(self, limit: int = 25) -> List[Dict[str, Any]]:
         """Get recent media files, optimized for large collections"""
         try:
-            # Use compound index for better performance on large collections
-            projection = {
-                "file_id": 1,
-                "file_name": 1,
-                "file_size": 1,
-                "file_type": 1,
-                "caption": 1,
-                "date": 1
-            }
-            
             # Get recent videos first (most requested content type)
             video_cursor = self.collection.find(
                 {"file_type": "video"},
-                projection
+                MEDIA_PROJECTION
             ).sort("date", -1).limit(limit)
             
             results = await video_cursor.to_list(length=limit)
@@ -199,7 +218,7 @@ class Database:
                         "file_type": {"$ne": "video"},
                         "file_id": {"$nin": video_ids}
                     },
-                    projection
+                    MEDIA_PROJECTION
                 ).sort("date", -1).limit(remaining_limit)
                 
                 other_results = await other_cursor.to_list(length=remaining_limit)
@@ -211,22 +230,13 @@ class Database:
             logger.error(f"Error getting recent media: {e}")
             return []
     
-    async def get_recent_videos(self, limit: int = 10) -> List[Dict[str, Any]]:
-        """Get recent videos specifically for empty queries"""
+    async def get_recent_videos(self, limit: int = 10) -> Optional[List[Dict[str, Any]]]:
+        """Get recent videos specifically for empty queries, or None on failure"""
         try:
-            projection = {
-                "file_id": 1,
-                "file_name": 1,
-                "file_size": 1,
-                "file_type": 1,
-                "caption": 1,
-                "date": 1
-            }
-            
             # Get only videos, sorted by most recent
             cursor = self.collection.find(
                 {"file_type": "video"},
-                projection
+                MEDIA_PROJECTION
             ).sort("date", -1).limit(limit)
             
             results = await cursor.to_list(length=limit)
@@ -234,7 +244,7 @@ class Database:
             
         except Exception as e:
             logger.error(f"Error getting recent videos: {e}")
-            return []
+            return None
     
     async def ban_user(self, user_id: int) -> bool:
         """Ban a user from using the bot"""
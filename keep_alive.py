@@ -1,19 +1,23 @@
-from flask import Flask
-import threading
+from aiohttp import web
 import os
 
-app = Flask(__name__)
+async def home(request):
+    return web.Response(text="✅ Bot is running!")
 
-@app.route('/')
-def home():
-    return "✅ Bot is running fine on Render!"
+async def keep_alive():
+    # Served from the bot's own event loop, no extra thread needed
+    app = web.Application()
+    app.router.add_get('/', home)
 
-def run():
-    # Render waxay ku siisaa port environment variable
-    port = int(os.environ.get("PORT", 8080))
-    app.run(host="0.0.0.0", port=port)
+    runner = web.AppRunner(app)
+    await runner.setup()
 
-def keep_alive():
-    t = threading.Thread(target=run)
-    t.daemon = True   # background thread
-    t.start()
\ No newline at end of file
+    # Render waxay ku siisaa PORT, Replit-na REPLIT_PORT (default 5000)
+    port = int(os.environ.get("PORT", os.environ.get("REPLIT_PORT", 5000)))
+    site = web.TCPSite(runner, "0.0.0.0", port)
+    try:
+        await site.start()
+    except Exception:
+        await runner.cleanup()
+        raise
+    return runner
@@ -22,10 +22,15 @@ logger = logging.getLogger(__name__)
 
 async def main():
     """Main function to start the bot"""
+    # Start keep-alive server (important for Render/Replit uptime)
+    # A bind failure (e.g. port in use) shouldn't stop the bot itself
+    web_runner = None
     try:
-        # Start keep-alive server (important for Render/Replit uptime)
-        keep_alive()
+        web_runner = await keep_alive()
+    except Exception as e:
+        logger.error(f"❌ Failed to start keep-alive server: {e}")
 
+    try:
         # Initialize and start the bot
         bot = MediaSearchBot()
         await bot.start()
@@ -37,9 +42,19 @@ async def main():
     except Exception as e:
         logger.error(f"❌ Failed to start bot: {e}", exc_info=True)
 
+    finally:
+        if web_runner:
+            await web_runner.cleanup()
+
 
 if __name__ == "__main__":
     import pyrogram
     from pyrogram import idle
 
-    asyncio.run(main())
+    # uvloop gives a faster event loop; fall back to asyncio where it isn't available (e.g. Windows)
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(main())
+    else:
+        uvloop.run(main())
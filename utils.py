@@ -2,13 +2,50 @@
 Utility Functions
 """
 
+import asyncio
 import logging
-from typing import Optional, List
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, List
 from pyrogram.types import Message, User
 from config import Config
 
 logger = logging.getLogger(__name__)
 
+class TTLCache:
+    """Small in-memory LRU cache whose entries expire after ``ttl`` seconds"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return cached value for key, or default if missing/expired"""
+        item = self._data.get(key)
+        if item is None:
+            return default
+        value, expires_at = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store value, evicting the least recently used entry if full"""
+        self._data[key] = (value, time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all cached entries"""
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
 def format_file_size(size_bytes: int) -> str:
     """Format file size in human readable format"""
     if size_bytes == 0:
@@ -37,16 +74,30 @@ async def is_authorized_user(user_id: int, client) -> bool:
         return True
     return user_id in Config.AUTH_USERS or is_admin(user_id)
 
+# Users recently seen as channel members; membership rarely changes within minutes
+_SUBSCRIBED_CACHE = TTLCache(maxsize=50_000, ttl=300)
+# Bounds concurrent get_chat_member calls so a burst of new users doesn't trigger FloodWait
+_SUBSCRIPTION_SEMAPHORE = asyncio.Semaphore(20)
+
 async def is_subscribed(client, user_id: int) -> bool:
     """Check if user is subscribed to auth channel"""
     if not Config.AUTH_CHANNEL:
         return True
     
+    # Only positive answers are cached so a user who just joined isn't kept waiting
+    if _SUBSCRIBED_CACHE.get(user_id):
+        return True
+    
     try:
-        member = await client.get_chat_member(Config.AUTH_CHANNEL, user_id)
-        return member.status not in ["kicked", "left"]
+        async with _SUBSCRIPTION_SEMAPHORE:
+            member = await client.get_chat_member(Config.AUTH_CHANNEL, user_id)
+        subscribed = member.status not in ["kicked", "left"]
     except Exception:
         return False
+    
+    if subscribed:
+        _SUBSCRIBED_CACHE.set(user_id, True)
+    return subscribed
 
 def extract_media_info(message: Message) -> Optional[dict]:
     """Extract media information from message"""